@@ -9,6 +9,7 @@ import * as timestream from 'aws-cdk-lib/aws-timestream';
 import * as neptune from 'aws-cdk-lib/aws-neptune';
 import { Construct } from 'constructs';
 import { ApiGatewayConfig, LambdaConfig } from '../config/stack-config';
+import { LambdaCodeUtils } from '../utils/lambda-code';
 
 export interface ApiGatewayConstructProps {
   readonly vpc: ec2.Vpc;
@@ -113,7 +114,7 @@ export class ApiGatewayConstruct extends Construct {
         NEPTUNE_ENDPOINT: neptuneCluster.attrEndpoint,
         NEPTUNE_PORT: neptuneCluster.attrPort,
       },
-      code: lambda.Code.fromAsset('lib/lambda/query-function'),
+      code: LambdaCodeUtils.pythonAsset('lib/lambda/query-function'),
       logRetention: logs.RetentionDays.TWO_YEARS,
     });
   }
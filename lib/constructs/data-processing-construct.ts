@@ -11,6 +11,7 @@ import * as neptune from 'aws-cdk-lib/aws-neptune';
 import * as logs from 'aws-cdk-lib/aws-logs';
 import { Construct } from 'constructs';
 import { KinesisConfig, LambdaConfig } from '../config/stack-config';
+import { LambdaCodeUtils } from '../utils/lambda-code';
 
 export interface DataProcessingConstructProps {
   readonly vpc: ec2.Vpc;
@@ -161,6 +162,7 @@ export class DataProcessingConstruct extends Construct {
               actions: [
                 's3:GetObject',
                 's3:PutObject',
+                's3:AbortMultipartUpload',
               ],
               resources: [`${dataBucket.bucketArn}/*`],
             }),
@@ -199,7 +201,7 @@ export class DataProcessingConstruct extends Construct {
         S3_BUCKET: dataBucket.bucketName,
         KMS_KEY_ID: encryptionKey.keyId,
       },
-      code: lambda.Code.fromAsset('lib/lambda/data-processor'),
+      code: LambdaCodeUtils.pythonAsset('lib/lambda/data-processor'),
       logRetention: logs.RetentionDays.TWO_YEARS,
     });
   }
@@ -210,6 +212,7 @@ export class DataProcessingConstruct extends Construct {
         batchSize: 10,
         startingPosition: lambda.StartingPosition.LATEST,
         retryAttempts: 3,
+        reportBatchItemFailures: true,
       })
     );
   }
@@ -39,6 +39,7 @@ export class DataStorageConstruct extends Construct {
     return new s3.Bucket(this, 'DataBucket', {
       encryption: s3.BucketEncryption.KMS,
       encryptionKey: encryptionKey,
+      bucketKeyEnabled: true,
       blockPublicAccess: s3.BlockPublicAccess.BLOCK_ALL,
       versioned: true,
       enforceSSL: true,
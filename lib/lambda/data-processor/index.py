@@ -3,61 +3,157 @@ Data Processor Lambda Function
 Processes data from Kinesis and writes to Timestream and Neptune
 """
 
-import json
 import boto3
+import orjson
+import zstandard
 import os
-from datetime import datetime
+import time
+from datetime import datetime, timedelta, timezone
 import logging
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional, Set, Tuple
 import base64
+import io
+from concurrent.futures import ThreadPoolExecutor
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+from botocore.exceptions import ClientError
 
 # Configure logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
+# Client configuration: a connection pool large enough for the concurrent
+# multipart upload threads, adaptive retries for Timestream throttling and
+# TCP keepalive so reused execution environments keep their connections
+BOTO_CONFIG = Config(
+    max_pool_connections=64,
+    retries={'max_attempts': 10, 'mode': 'adaptive'},
+    tcp_keepalive=True
+)
+
 # Initialize AWS clients
-timestream_client = boto3.client('timestream-write')
-s3_client = boto3.client('s3')
+timestream_client = boto3.client('timestream-write', config=BOTO_CONFIG)
+s3_client = boto3.client('s3', config=BOTO_CONFIG)
+
+# Runs the S3 archive upload concurrently with the Timestream writes
+_archive_executor = ThreadPoolExecutor(max_workers=1)
+
+# Archive compressor; only used from the single archive worker thread
+_zstd_compressor = zstandard.ZstdCompressor(level=3)
+
+# Environment configuration, resolved once per cold start
+TIMESTREAM_DATABASE = os.environ['TIMESTREAM_DATABASE']
+TIMESTREAM_TABLE = os.environ['TIMESTREAM_TABLE']
+S3_BUCKET = os.environ['S3_BUCKET']
+KMS_KEY_ID = os.environ.get('KMS_KEY_ID')
+AWS_REGION = os.environ.get('AWS_REGION', 'us-east-1')
+
+# Maximum number of records accepted by a single Timestream WriteRecords call
+TIMESTREAM_MAX_RECORDS_PER_WRITE = 100
+
+# Attributes shared by every record of a WriteRecords call; all metrics of a
+# payload are written as named measures of a single multi-measure record
+TIMESTREAM_COMMON_ATTRIBUTES = {
+    'TimeUnit': 'MICROSECONDS',
+    'MeasureName': 'metrics',
+    'MeasureValueType': 'MULTI'
+}
+
+# WriteRecords errors that may succeed when the chunk is retried; other
+# client errors and per-record rejections fail the same way every time
+TIMESTREAM_TRANSIENT_ERROR_CODES = frozenset((
+    'ThrottlingException',
+    'InternalServerException'
+))
+
+# Reference point for converting payload timestamps to epoch time
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+# strftime format of the hourly, UTC date-partitioned archive key prefix
+ARCHIVE_KEY_PREFIX_FORMAT = 'raw-data/%Y/%m/%d/%H/'
+
+# JSON number types accepted as metric values
+NUMERIC_TYPES = frozenset((int, float))
+
+# Archives larger than the threshold are uploaded with concurrent multipart upload
+S3_TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=128 * 1024 * 1024,
+    multipart_chunksize=32 * 1024 * 1024,
+    max_concurrency=10,
+    use_threads=True
+)
 
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     """
     Main handler function for processing Kinesis records
     
+    Records are decoded first and their Timestream records accumulated into
+    a single list, which is then written to Timestream in as few WriteRecords calls
+    as possible instead of one call per Kinesis record. The raw batch is
+    archived to S3 at the same time.
+    
     Args:
         event: Kinesis event containing records
         context: Lambda context
         
     Returns:
-        Response dictionary with status and message
+        Partial batch response listing the Kinesis records to retry
     """
     try:
-        processed_count = 0
-        failed_count = 0
+        decoded_records = []
+        timestream_records = []
+        timestream_sequences = []
+        decode_failed_count = 0
         
+        # Pass 1: decode every record and build its Timestream record
         for record in event.get('Records', []):
+            kinesis_data = record.get('kinesis', {})
+            sequence_number = kinesis_data.get('sequenceNumber')
+            
             try:
-                # Decode Kinesis data
                 payload = decode_kinesis_record(record)
                 
-                # Process the payload
-                process_record(payload, record.get('kinesis', {}).get('sequenceNumber'))
-                processed_count += 1
+                if payload.get('metrics'):
+                    record_time = get_record_time(payload, kinesis_data)
+                    timestream_record = build_timestream_record(payload, record_time)
+                    if timestream_record:
+                        timestream_records.append(timestream_record)
+                        timestream_sequences.append(sequence_number)
+                
+                decoded_records.append((payload, sequence_number))
                 
             except Exception as e:
-                logger.error(f"Error processing individual record: {str(e)}")
-                failed_count += 1
+                logger.error(f"Error decoding individual record: {str(e)}")
+                decode_failed_count += 1
                 continue
         
-        logger.info(f"Processed {processed_count} records successfully, {failed_count} failed")
+        # Pass 2: archive to S3 in the background while writing to Timestream
+        key_prefix = datetime.now(timezone.utc).strftime(ARCHIVE_KEY_PREFIX_FORMAT)
+        archive_future = _archive_executor.submit(archive_to_s3, decoded_records, key_prefix)
+        retry_sequences, dropped_sequences = write_to_timestream(timestream_records, timestream_sequences)
+        
+        # archive_to_s3 swallows its own errors
+        archive_future.result()
+        
+        # TODO: Write graph data to Neptune
+        # write_to_neptune(payload) for each decoded payload
+        
+        failed_count = decode_failed_count + len(retry_sequences) + len(dropped_sequences)
+        processed_count = len(decoded_records) - len(retry_sequences) - len(dropped_sequences)
         
+        logger.info(
+            f"Processed {processed_count} records successfully, {failed_count} failed, "
+            f"{len(retry_sequences)} to retry"
+        )
+        
+        # Only records that can succeed on retry are reported; undecodable
+        # and rejected records would fail the same way again and are dropped
         return {
-            'statusCode': 200,
-            'body': json.dumps({
-                'message': 'Successfully processed records',
-                'processed': processed_count,
-                'failed': failed_count
-            })
+            'batchItemFailures': [
+                {'itemIdentifier': sequence_number}
+                for sequence_number in retry_sequences
+            ]
         }
         
     except Exception as e:
@@ -69,76 +165,159 @@ def decode_kinesis_record(record: Dict[str, Any]) -> Dict[str, Any]:
     """
     Decode Kinesis record data
     
+    orjson parses the decoded bytes directly, without an intermediate str.
+    Data that is already bytes is parsed without base64 decoding.
+    
     Args:
         record: Kinesis record
         
     Returns:
         Decoded payload as dictionary
+        
+    Raises:
+        ValueError: If the record has no Kinesis data
     """
-    kinesis_data = record.get('kinesis', {})
-    encoded_data = kinesis_data.get('data', '')
+    try:
+        data = record['kinesis']['data']
+    except KeyError:
+        raise ValueError("Kinesis record has no data")
     
-    # Decode base64 data
-    decoded_data = base64.b64decode(encoded_data).decode('utf-8')
+    if isinstance(data, (bytes, bytearray)):
+        return orjson.loads(data)
     
-    return json.loads(decoded_data)
+    return orjson.loads(base64.b64decode(data))
 
 
-def process_record(payload: Dict[str, Any], sequence_number: str) -> None:
+def get_record_time(payload: Dict[str, Any], kinesis_data: Dict[str, Any]) -> str:
     """
-    Process a single record by writing to Timestream and archiving to S3
+    Get the Timestream timestamp for a Kinesis record
+    
+    The payload's own ISO 8601 timestamp is used so that records of one
+    PutRecords call, which share an arrival time, keep distinct times and
+    retried records keep their original time. Timestamps without a timezone
+    are treated as UTC. The Kinesis approximate arrival timestamp is only a
+    fallback for payloads without a usable timestamp.
     
     Args:
         payload: Decoded record payload
-        sequence_number: Kinesis sequence number
+        kinesis_data: Kinesis portion of the record
+        
+    Returns:
+        Epoch time in microseconds as string
     """
-    # Write time-series data to Timestream
-    if payload.get('metrics'):
-        write_to_timestream(payload)
+    timestamp = payload.get('timestamp')
+    if isinstance(timestamp, str):
+        try:
+            record_datetime = datetime.fromisoformat(timestamp)
+            if record_datetime.tzinfo is None:
+                record_datetime = record_datetime.replace(tzinfo=timezone.utc)
+            return str((record_datetime - EPOCH) // timedelta(microseconds=1))
+        except ValueError:
+            logger.warning(f"Invalid payload timestamp, using arrival time: {timestamp}")
     
-    # Archive raw data to S3
-    archive_to_s3(payload, sequence_number)
+    arrival_timestamp = kinesis_data.get('approximateArrivalTimestamp')
+    if arrival_timestamp is None:
+        return str(time.time_ns() // 1_000)
     
-    # TODO: Write graph data to Neptune
-    # write_to_neptune(payload)
+    return str(int(arrival_timestamp * 1_000_000))
 
 
-def write_to_timestream(data: Dict[str, Any]) -> None:
+def build_timestream_record(data: Dict[str, Any], record_time: str) -> Optional[Dict[str, Any]]:
     """
-    Write metrics to Timestream
+    Build a multi-measure Timestream record for the metrics of a single payload
+    
+    Every numeric metric becomes a named DOUBLE measure of the record.
+    TimeUnit, MeasureName and MeasureValueType are sent once per request via
+    TIMESTREAM_COMMON_ATTRIBUTES.
     
     Args:
         data: Data containing metrics to write
+        record_time: Epoch time in microseconds as string
+        
+    Returns:
+        Timestream record, or None if the payload has no numeric metrics
     """
-    records = []
-    current_time = str(int(datetime.now().timestamp() * 1000))
+    measure_values = []
     
     for metric_name, metric_value in data.get('metrics', {}).items():
-        if not isinstance(metric_value, (int, float)):
+        # Exact type lookup skips the MRO walk of isinstance and excludes bool
+        if type(metric_value) not in NUMERIC_TYPES:
             logger.warning(f"Skipping non-numeric metric: {metric_name} = {metric_value}")
             continue
-            
-        record = {
-            'Time': current_time,
-            'TimeUnit': 'MILLISECONDS',
-            'MeasureName': metric_name,
-            'MeasureValue': str(metric_value),
-            'MeasureValueType': 'DOUBLE',
-            'Dimensions': build_dimensions(data)
-        }
-        records.append(record)
+        
+        measure_values.append({
+            'Name': metric_name,
+            'Value': str(metric_value),
+            'Type': 'DOUBLE'
+        })
+    
+    if not measure_values:
+        return None
+    
+    return {
+        'Time': record_time,
+        'Dimensions': build_dimensions(data),
+        'MeasureValues': measure_values
+    }
+
+
+def write_to_timestream(
+    records: List[Dict[str, Any]],
+    sequence_numbers: List[str]
+) -> Tuple[Set[str], Set[str]]:
+    """
+    Write records to Timestream in batches of up to 100 records per call
+    
+    Chunks failing with a transient error (throttling, service or network
+    errors) are reported for retry. Records rejected by Timestream and chunks
+    failing with any other client error are logged and dropped, since
+    Kinesis would redeliver them and every later record of the shard only to
+    fail again.
     
-    if records:
+    Args:
+        records: Timestream records to write
+        sequence_numbers: Kinesis sequence number of each record, by index
+        
+    Returns:
+        Sequence numbers of the Kinesis records to retry, and of those dropped
+    """
+    retry_sequences = set()
+    dropped_sequences = set()
+    
+    for offset in range(0, len(records), TIMESTREAM_MAX_RECORDS_PER_WRITE):
+        chunk = records[offset:offset + TIMESTREAM_MAX_RECORDS_PER_WRITE]
+        chunk_sequences = sequence_numbers[offset:offset + TIMESTREAM_MAX_RECORDS_PER_WRITE]
+        
         try:
             timestream_client.write_records(
-                DatabaseName=os.environ['TIMESTREAM_DATABASE'],
-                TableName=os.environ['TIMESTREAM_TABLE'],
-                Records=records
+                DatabaseName=TIMESTREAM_DATABASE,
+                TableName=TIMESTREAM_TABLE,
+                CommonAttributes=TIMESTREAM_COMMON_ATTRIBUTES,
+                Records=chunk
             )
-            logger.info(f"Written {len(records)} records to Timestream")
+            logger.info(f"Written {len(chunk)} records to Timestream")
+        except timestream_client.exceptions.RejectedRecordsException as e:
+            rejected_records = e.response.get('RejectedRecords', [])
+            for rejected in rejected_records:
+                logger.error(
+                    f"Timestream rejected record {rejected.get('RecordIndex')}, dropping it: "
+                    f"{rejected.get('Reason')}"
+                )
+                dropped_sequences.add(chunk_sequences[rejected['RecordIndex']])
+            logger.info(f"Written {len(chunk) - len(rejected_records)} records to Timestream")
+        except ClientError as e:
+            error_code = e.response.get('Error', {}).get('Code')
+            if error_code in TIMESTREAM_TRANSIENT_ERROR_CODES:
+                logger.warning(f"Transient error writing to Timestream, will retry: {str(e)}")
+                retry_sequences.update(chunk_sequences)
+            else:
+                logger.error(f"Error writing to Timestream, dropping {len(chunk)} records: {str(e)}")
+                dropped_sequences.update(chunk_sequences)
         except Exception as e:
-            logger.error(f"Error writing to Timestream: {str(e)}")
-            raise
+            logger.warning(f"Error writing to Timestream, will retry: {str(e)}")
+            retry_sequences.update(chunk_sequences)
+    
+    return retry_sequences, dropped_sequences
 
 
 def build_dimensions(data: Dict[str, Any]) -> List[Dict[str, str]]:
@@ -158,7 +337,7 @@ def build_dimensions(data: Dict[str, Any]) -> List[Dict[str, str]]:
         },
         {
             'Name': 'region',
-            'Value': os.environ.get('AWS_REGION', 'us-east-1')
+            'Value': AWS_REGION
         }
     ]
     
@@ -174,26 +353,40 @@ def build_dimensions(data: Dict[str, Any]) -> List[Dict[str, str]]:
     return dimensions
 
 
-def archive_to_s3(data: Dict[str, Any], sequence_number: str) -> None:
+def archive_to_s3(records: List[Tuple[Dict[str, Any], str]], key_prefix: str) -> None:
     """
-    Archive raw data to S3
+    Archive raw data of a batch to S3 as a single zstd-compressed NDJSON object
     
     Args:
-        data: Data to archive
-        sequence_number: Kinesis sequence number for unique key
+        records: Tuples of data to archive and its Kinesis sequence number,
+            in stream order
+        key_prefix: Date-partitioned S3 key prefix for this invocation
     """
+    if not records:
+        return
+    
     try:
-        key = f"raw-data/{datetime.now().strftime('%Y/%m/%d')}/{sequence_number}.json"
-        
-        s3_client.put_object(
-            Bucket=os.environ['S3_BUCKET'],
-            Key=key,
-            Body=json.dumps(data, default=str),
-            ServerSideEncryption='aws:kms',
-            SSEKMSKeyId=os.environ.get('KMS_KEY_ID'),
-            ContentType='application/json'
-        )
-        logger.debug(f"Archived data to S3: {key}")
+        buffer = io.BytesIO()
+        for data, _ in records:
+            buffer.write(orjson.dumps(data, default=str))
+            buffer.write(b"\n")
+        
+        first_sequence = records[0][1]
+        last_sequence = records[-1][1]
+        key = key_prefix + first_sequence + '-' + last_sequence + '.ndjson.zst'
+        
+        # The S3 Bucket Key configured on the bucket applies to these uploads,
+        # so KMS is not called for every archived object
+        extra_args = {
+            'ServerSideEncryption': 'aws:kms',
+            'SSEKMSKeyId': KMS_KEY_ID,
+            'ContentType': 'application/x-ndjson',
+            'ContentEncoding': 'zstd'
+        }
+        
+        body = io.BytesIO(_zstd_compressor.compress(buffer.getvalue()))
+        s3_client.upload_fileobj(body, S3_BUCKET, key, ExtraArgs=extra_args, Config=S3_TRANSFER_CONFIG)
+        logger.debug(f"Archived {len(records)} records to S3: {key}")
         
     except Exception as e:
         logger.error(f"Error archiving to S3: {str(e)}")
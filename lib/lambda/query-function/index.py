@@ -3,19 +3,102 @@ Query Lambda Function
 Handles API requests for querying time-series and graph data
 """
 
-import json
 import boto3
+import orjson
 import os
 import logging
-from typing import Dict, List, Any, Optional
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from botocore.config import Config
+from typing import Dict, Iterator, List, Any, Optional, Tuple
 from datetime import datetime, timedelta
+from functools import lru_cache
+from itertools import islice
 
 # Configure logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
+# Client configuration: adaptive retries for Timestream throttling and TCP
+# keepalive so reused execution environments keep their connections
+BOTO_CONFIG = Config(
+    max_pool_connections=64,
+    retries={'max_attempts': 10, 'mode': 'adaptive'},
+    tcp_keepalive=True
+)
+
 # Initialize AWS clients
-timestream_client = boto3.client('timestream-query')
+timestream_client = boto3.client('timestream-query', config=BOTO_CONFIG)
+
+# Upper bound on the number of rows returned by a single API request
+MAX_RESULT_ROWS = 10000
+
+# Query results are cached per warm execution environment, so dashboards
+# polling with identical parameters don't rerun the query every time
+QUERY_CACHE_TTL_SECONDS = 30
+QUERY_CACHE_MAX_ENTRIES = 256
+# Memory bounds: larger results are not cached, and least recently used
+# entries are evicted once the cache holds more rows in total
+QUERY_CACHE_MAX_ENTRY_ROWS = 1000
+QUERY_CACHE_MAX_ROWS = 20000
+_query_cache: 'OrderedDict[str, Tuple[float, List[Dict[str, Any]]]]' = OrderedDict()
+_query_cache_lock = threading.Lock()
+
+# Multi-measure record written by the data processor and its measures.
+# Each metric is a column of the table, so only known names may be selected.
+MEASURE_NAME = 'metrics'
+METRIC_NAMES = (
+    'temperature',
+    'humidity',
+    'pressure',
+    'cpu_usage',
+    'memory_usage',
+    'network_throughput',
+)
+
+# Query templates keyed on whether the optional filter is present.
+# Filter values are escaped with escape_sql_literal before substitution.
+METRICS_QUERY_TEMPLATES = {
+    False: """
+    SELECT 
+        source,
+        {metric_columns},
+        COUNT(*) as count
+    FROM "{database}"."{table}"
+    WHERE measure_name = '{measure_name}' AND time > ago({hours_back}h)
+    GROUP BY source
+    ORDER BY source
+    """,
+    True: """
+    SELECT 
+        source,
+        {metric_columns},
+        COUNT(*) as count
+    FROM "{database}"."{table}"
+    WHERE measure_name = '{measure_name}' AND time > ago({hours_back}h) AND source = '{source}'
+    GROUP BY source
+    ORDER BY source
+    """,
+}
+
+AGGREGATED_QUERY_TEMPLATE = """
+    SELECT 
+        bin(time, 1h) as time_bucket,
+        {metric_columns},
+        COUNT(*) as count
+    FROM "{database}"."{table}"
+    WHERE measure_name = '{measure_name}' AND time > ago({hours_back}h)
+    GROUP BY bin(time, 1h)
+    ORDER BY time_bucket DESC
+    """
+
+# Per-metric select columns shared by every metrics query
+METRICS_QUERY_COLUMNS = ",\n        ".join(
+    f"AVG({name}) as avg_{name}, MAX({name}) as max_{name}, MIN({name}) as min_{name}"
+    for name in METRIC_NAMES
+)
 
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
@@ -35,12 +118,9 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         query_type = query_params.get('type', 'metrics')
         
         # Route to appropriate handler
-        if query_type == 'metrics':
-            result = handle_metrics_query(query_params)
-        elif query_type == 'aggregated':
-            result = handle_aggregated_query(query_params)
-        elif query_type == 'health':
-            result = handle_health_check()
+        query_handler = QUERY_HANDLERS.get(query_type)
+        if query_handler:
+            result = query_handler(query_params)
         else:
             result = {'error': f'Unsupported query type: {query_type}'}
         
@@ -70,7 +150,7 @@ def create_response(status_code: int, body: Dict[str, Any]) -> Dict[str, Any]:
             'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
             'Access-Control-Allow-Headers': 'Content-Type, Authorization',
         },
-        'body': json.dumps(body, default=str)
+        'body': orjson.dumps(body, default=str).decode()
     }
 
 
@@ -87,16 +167,19 @@ def handle_metrics_query(params: Dict[str, str]) -> Dict[str, Any]:
     # Parse time range parameters
     hours_back = int(params.get('hours', '1'))
     source_filter = params.get('source')
+    max_rows = parse_row_limit(params)
     
     # Build and execute query
     query = build_metrics_query(hours_back, source_filter)
-    results = execute_timestream_query(query)
+    # One extra row tells whether the result was cut at max_rows
+    results = execute_timestream_query(query, max_rows + 1)
     
     return {
         'query_type': 'metrics',
         'time_range_hours': hours_back,
         'source_filter': source_filter,
-        'results': results,
+        'results': results[:max_rows],
+        'truncated': len(results) > max_rows,
         'timestamp': datetime.now().isoformat()
     }
 
@@ -113,19 +196,38 @@ def handle_aggregated_query(params: Dict[str, str]) -> Dict[str, Any]:
     """
     hours_back = int(params.get('hours', '24'))
     metric_name = params.get('metric')
+    max_rows = parse_row_limit(params)
+    
+    if metric_name and metric_name not in METRIC_NAMES:
+        return {'error': f'Unsupported metric: {metric_name}'}
     
     query = build_aggregated_query(hours_back, metric_name)
-    results = execute_timestream_query(query)
+    # One extra row tells whether the result was cut at max_rows
+    results = execute_timestream_query(query, max_rows + 1)
     
     return {
         'query_type': 'aggregated',
         'time_range_hours': hours_back,
         'metric_filter': metric_name,
-        'results': results,
+        'results': results[:max_rows],
+        'truncated': len(results) > max_rows,
         'timestamp': datetime.now().isoformat()
     }
 
 
+def parse_row_limit(params: Dict[str, str]) -> int:
+    """
+    Parse the optional row limit, capped at MAX_RESULT_ROWS
+    
+    Args:
+        params: Query parameters
+        
+    Returns:
+        Maximum number of rows to return
+    """
+    return max(1, min(int(params.get('limit', MAX_RESULT_ROWS)), MAX_RESULT_ROWS))
+
+
 def handle_health_check() -> Dict[str, Any]:
     """
     Handle health check requests
@@ -141,7 +243,7 @@ def handle_health_check() -> Dict[str, Any]:
         WHERE time > ago(1h)
         """
         
-        result = execute_timestream_query(query)
+        result = execute_timestream_query(query, max_rows=1, use_cache=False)
         record_count = result[0].get('record_count', '0') if result else '0'
         
         return {
@@ -160,6 +262,15 @@ def handle_health_check() -> Dict[str, Any]:
         }
 
 
+# Query handlers keyed on the 'type' query parameter
+QUERY_HANDLERS = {
+    'metrics': handle_metrics_query,
+    'aggregated': handle_aggregated_query,
+    'health': lambda params: handle_health_check(),
+}
+
+
+@lru_cache(maxsize=128)
 def build_metrics_query(hours_back: int, source_filter: Optional[str] = None) -> str:
     """
     Build Timestream query for metrics
@@ -171,86 +282,170 @@ def build_metrics_query(hours_back: int, source_filter: Optional[str] = None) ->
     Returns:
         Timestream query string
     """
-    where_clauses = [f"time > ago({hours_back}h)"]
-    
-    if source_filter:
-        where_clauses.append(f"source = '{source_filter}'")
-    
-    where_clause = " AND ".join(where_clauses)
+    template = METRICS_QUERY_TEMPLATES[bool(source_filter)]
     
-    return f"""
-    SELECT 
-        measure_name,
-        AVG(measure_value::double) as avg_value,
-        MAX(measure_value::double) as max_value,
-        MIN(measure_value::double) as min_value,
-        COUNT(*) as count,
-        source
-    FROM "{os.environ['TIMESTREAM_DATABASE']}"."{os.environ['TIMESTREAM_TABLE']}"
-    WHERE {where_clause}
-    GROUP BY measure_name, source
-    ORDER BY measure_name, source
-    """
+    return template.format(
+        metric_columns=METRICS_QUERY_COLUMNS,
+        database=os.environ['TIMESTREAM_DATABASE'],
+        table=os.environ['TIMESTREAM_TABLE'],
+        measure_name=MEASURE_NAME,
+        hours_back=int(hours_back),
+        source=escape_sql_literal(source_filter or '')
+    )
 
 
+@lru_cache(maxsize=128)
 def build_aggregated_query(hours_back: int, metric_name: Optional[str] = None) -> str:
     """
     Build Timestream query for aggregated data
     
     Args:
         hours_back: Number of hours to look back
-        metric_name: Optional metric name filter
+        metric_name: Optional metric to aggregate, one of METRIC_NAMES
         
     Returns:
         Timestream query string
     """
-    where_clauses = [f"time > ago({hours_back}h)"]
+    if metric_name and metric_name not in METRIC_NAMES:
+        raise ValueError(f"Unsupported metric: {metric_name}")
     
-    if metric_name:
-        where_clauses.append(f"measure_name = '{metric_name}'")
+    metric_names = (metric_name,) if metric_name else METRIC_NAMES
+    metric_columns = ",\n        ".join(f"AVG({name}) as avg_{name}" for name in metric_names)
     
-    where_clause = " AND ".join(where_clauses)
+    return AGGREGATED_QUERY_TEMPLATE.format(
+        metric_columns=metric_columns,
+        database=os.environ['TIMESTREAM_DATABASE'],
+        table=os.environ['TIMESTREAM_TABLE'],
+        measure_name=MEASURE_NAME,
+        hours_back=int(hours_back)
+    )
+
+
+def escape_sql_literal(value: str) -> str:
+    """
+    Escape a value for use inside a single-quoted SQL string literal
     
-    return f"""
-    SELECT 
-        bin(time, 1h) as time_bucket,
-        measure_name,
-        AVG(measure_value::double) as avg_value,
-        COUNT(*) as count
-    FROM "{os.environ['TIMESTREAM_DATABASE']}"."{os.environ['TIMESTREAM_TABLE']}"
-    WHERE {where_clause}
-    GROUP BY bin(time, 1h), measure_name
-    ORDER BY time_bucket DESC, measure_name
+    Timestream does not support bind parameters, so user supplied filter
+    values are escaped by doubling single quotes.
+    
+    Args:
+        value: Raw value
+        
+    Returns:
+        Escaped value
     """
+    return value.replace("'", "''")
 
 
-def execute_timestream_query(query: str) -> List[Dict[str, Any]]:
+def execute_timestream_query(
+    query: str,
+    max_rows: int = MAX_RESULT_ROWS,
+    use_cache: bool = True
+) -> List[Dict[str, Any]]:
     """
     Execute Timestream query and return results
     
     Args:
         query: Timestream query string
+        max_rows: Maximum number of rows to return
+        use_cache: Whether recently cached results may be returned
         
     Returns:
         List of result dictionaries
     """
+    cache_key = hashlib.blake2b(f"{max_rows}:{query}".encode(), digest_size=16).hexdigest()
+    
+    if use_cache:
+        cached_results = get_cached_results(cache_key)
+        if cached_results is not None:
+            logger.info(f"Returning {len(cached_results)} cached rows")
+            return cached_results
+    
     try:
         logger.info(f"Executing query: {query}")
         
-        response = timestream_client.query(QueryString=query)
-        
-        results = []
-        for row in response.get('Rows', []):
-            result = {}
-            for i, column in enumerate(response.get('ColumnInfo', [])):
-                column_name = column.get('Name', f'column_{i}')
-                column_value = row.get('Data', [{}])[i].get('ScalarValue', '')
-                result[column_name] = column_value
-            results.append(result)
+        results = list(islice(iter_timestream_query(query), max_rows))
         
         logger.info(f"Query returned {len(results)} rows")
+        
+        if use_cache:
+            cache_results(cache_key, results)
         return results
         
     except Exception as e:
         logger.error(f"Error executing Timestream query: {str(e)}")
         raise
+
+
+def get_cached_results(cache_key: str) -> Optional[List[Dict[str, Any]]]:
+    """
+    Get query results cached within the last QUERY_CACHE_TTL_SECONDS
+    
+    Args:
+        cache_key: Hash of the query and row limit
+        
+    Returns:
+        Cached results, or None if absent or expired
+    """
+    with _query_cache_lock:
+        entry = _query_cache.get(cache_key)
+        if entry is None:
+            return None
+        
+        cached_at, results = entry
+        if time.monotonic() - cached_at >= QUERY_CACHE_TTL_SECONDS:
+            del _query_cache[cache_key]
+            return None
+        
+        _query_cache.move_to_end(cache_key)
+        return results
+
+
+def cache_results(cache_key: str, results: List[Dict[str, Any]]) -> None:
+    """
+    Cache query results, evicting the least recently used entries
+    
+    Results with more than QUERY_CACHE_MAX_ENTRY_ROWS rows are not cached.
+    
+    Args:
+        cache_key: Hash of the query and row limit
+        results: Query results
+    """
+    if len(results) > QUERY_CACHE_MAX_ENTRY_ROWS:
+        return
+    
+    with _query_cache_lock:
+        _query_cache[cache_key] = (time.monotonic(), results)
+        _query_cache.move_to_end(cache_key)
+        
+        cached_rows = sum(len(cached) for _, cached in _query_cache.values())
+        while len(_query_cache) > QUERY_CACHE_MAX_ENTRIES or cached_rows > QUERY_CACHE_MAX_ROWS:
+            _, (_, evicted) = _query_cache.popitem(last=False)
+            cached_rows -= len(evicted)
+
+
+def iter_timestream_query(query: str) -> Iterator[Dict[str, Any]]:
+    """
+    Execute Timestream query and lazily yield rows across all result pages
+    
+    Pages are only requested as rows are consumed, so callers that stop
+    early never fetch the remaining pages.
+    
+    Args:
+        query: Timestream query string
+        
+    Yields:
+        Result row as dictionary keyed by column name
+    """
+    paginator = timestream_client.get_paginator('query')
+    column_names = None
+    
+    for page in paginator.paginate(QueryString=query):
+        if column_names is None:
+            column_names = [
+                column.get('Name', f'column_{i}')
+                for i, column in enumerate(page.get('ColumnInfo', []))
+            ]
+        
+        for row in page.get('Rows', []):
+            yield dict(zip(column_names, (datum.get('ScalarValue', '') for datum in row['Data'])))
@@ -0,0 +1,18 @@
+import * as lambda from 'aws-cdk-lib/aws-lambda';
+
+export class LambdaCodeUtils {
+  /**
+   * Package a Python Lambda asset together with the dependencies from its requirements.txt
+   */
+  static pythonAsset(assetPath: string): lambda.Code {
+    return lambda.Code.fromAsset(assetPath, {
+      bundling: {
+        image: lambda.Runtime.PYTHON_3_12.bundlingImage,
+        command: [
+          'bash', '-c',
+          'pip install --no-cache-dir -r requirements.txt -t /asset-output && cp -au . /asset-output',
+        ],
+      },
+    });
+  }
+}
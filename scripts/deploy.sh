@@ -84,7 +84,7 @@ echo ""
 
 # Test data sending
 echo "🧪 Testing data ingestion..."
-if command -v python3 &> /dev/null; then
+if command -v python3 &> /dev/null && python3 -m pip install --quiet -r scripts/requirements.txt; then
     echo "📤 Sending test data to Kinesis..."
     python3 scripts/send_test_data.py --stream-name "$KINESIS_STREAM" --region "$REGION" --count 5 --interval 2
     
@@ -102,8 +102,8 @@ if command -v python3 &> /dev/null; then
     echo "  • Aggregated query:"
     curl -s "$API_URL/query?type=aggregated&hours=1" | jq '.' || echo "Aggregated query completed"
 else
-    echo "⚠️  Python3 not found. Skipping test data sending."
-    echo "   You can manually send test data using: python3 scripts/send_test_data.py --stream-name $KINESIS_STREAM"
+    echo "⚠️  Python3 or the test data sender dependencies are not available. Skipping test data sending."
+    echo "   You can manually send test data using: pip install -r scripts/requirements.txt && python3 scripts/send_test_data.py --stream-name $KINESIS_STREAM"
 fi
 
 echo ""
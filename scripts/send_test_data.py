@@ -4,77 +4,130 @@ Test data sender for Timestream Neptune Analytics Platform
 Sends sample data to Kinesis Data Stream for testing
 """
 
-import json
+import orjson
 import boto3
+from botocore.config import Config
+import numpy as np
 import time
-import random
-from datetime import datetime
+from datetime import datetime, timezone
+from itertools import islice
 import argparse
 
-def generate_sample_data():
-    """Generate sample metrics data"""
-    return {
-        "timestamp": datetime.now().isoformat(),
-        "source": f"sensor-{random.randint(1, 10)}",
-        "metrics": {
-            "temperature": round(random.uniform(20.0, 35.0), 2),
-            "humidity": round(random.uniform(30.0, 80.0), 2),
-            "pressure": round(random.uniform(1000.0, 1020.0), 2),
-            "cpu_usage": round(random.uniform(10.0, 90.0), 2),
-            "memory_usage": round(random.uniform(20.0, 85.0), 2),
-            "network_throughput": round(random.uniform(100.0, 1000.0), 2)
-        },
-        "relationships": {
-            "device_id": f"device-{random.randint(1, 5)}",
-            "location": random.choice(["tokyo", "osaka", "nagoya", "fukuoka", "sapporo"]),
-            "zone": random.choice(["zone-a", "zone-b", "zone-c"])
-        }
+# Kinesis accepts at most 500 records per PutRecords call
+KINESIS_MAX_RECORDS_PER_PUT = 500
+# Number of PutRecords attempts for records that keep failing
+MAX_PUT_ATTEMPTS = 5
+
+# Value ranges of the generated sample metrics
+METRIC_RANGES = {
+    "temperature": (20.0, 35.0),
+    "humidity": (30.0, 80.0),
+    "pressure": (1000.0, 1020.0),
+    "cpu_usage": (10.0, 90.0),
+    "memory_usage": (20.0, 85.0),
+    "network_throughput": (100.0, 1000.0)
+}
+LOCATIONS = ["tokyo", "osaka", "nagoya", "fukuoka", "sapporo"]
+ZONES = ["zone-a", "zone-b", "zone-c"]
+
+def generate_sample_data_batch(n):
+    """Generate n sample metrics records, drawing each field for all records in one NumPy call"""
+    rng = np.random.default_rng()
+    
+    sensor_ids = rng.integers(1, 11, n).tolist()
+    metrics = {
+        name: np.round(rng.uniform(low, high, n), 2).tolist()
+        for name, (low, high) in METRIC_RANGES.items()
     }
+    device_ids = rng.integers(1, 6, n).tolist()
+    locations = rng.choice(LOCATIONS, n).tolist()
+    zones = rng.choice(ZONES, n).tolist()
+    
+    # Records are assembled from the columns only when consumed
+    for i in range(n):
+        yield {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "source": f"sensor-{sensor_ids[i]}",
+            "metrics": {name: values[i] for name, values in metrics.items()},
+            "relationships": {
+                "device_id": f"device-{device_ids[i]}",
+                "location": locations[i],
+                "zone": zones[i]
+            }
+        }
 
-def send_to_kinesis(stream_name, data, region='us-east-1'):
-    """Send data to Kinesis Data Stream"""
-    kinesis_client = boto3.client('kinesis', region_name=region)
+def create_kinesis_client(region='us-east-1'):
+    """Create a Kinesis client shared by every send"""
+    return boto3.client(
+        'kinesis',
+        region_name=region,
+        config=Config(max_pool_connections=64, retries={'max_attempts': 10, 'mode': 'adaptive'})
+    )
+
+def send_to_kinesis(kinesis_client, stream_name, batch):
+    """Send a batch of data to Kinesis Data Stream, retrying only the failed records"""
+    entries = [{'Data': orjson.dumps(data), 'PartitionKey': data['source']} for data in batch]
+    sent_count = 0
+    
+    for attempt in range(MAX_PUT_ATTEMPTS):
+        try:
+            response = kinesis_client.put_records(StreamName=stream_name, Records=entries)
+        except Exception as e:
+            print(f"❌ Error sending data: {str(e)}")
+            break
+        
+        failed_entries = [
+            entry for entry, result in zip(entries, response['Records'])
+            if 'ErrorCode' in result
+        ]
+        sent_count += len(entries) - len(failed_entries)
+        
+        if not failed_entries or attempt == MAX_PUT_ATTEMPTS - 1:
+            break
+        
+        print(f"⚠️  {len(failed_entries)} records failed, retrying ({attempt + 1}/{MAX_PUT_ATTEMPTS})...")
+        entries = failed_entries
+        time.sleep(0.1 * 2 ** attempt)
     
-    try:
-        response = kinesis_client.put_record(
-            StreamName=stream_name,
-            Data=json.dumps(data),
-            PartitionKey=data['source']
-        )
-        print(f"✅ Data sent successfully. Shard ID: {response['ShardId']}, Sequence: {response['SequenceNumber']}")
-        return True
-    except Exception as e:
-        print(f"❌ Error sending data: {str(e)}")
-        return False
+    print(f"✅ Sent {sent_count}/{len(batch)} records in batch")
+    return sent_count
 
 def main():
     parser = argparse.ArgumentParser(description='Send test data to Kinesis stream')
     parser.add_argument('--stream-name', required=True, help='Kinesis stream name')
     parser.add_argument('--region', default='us-east-1', help='AWS region')
     parser.add_argument('--count', type=int, default=10, help='Number of records to send')
-    parser.add_argument('--interval', type=float, default=1.0, help='Interval between sends (seconds)')
+    parser.add_argument('--interval', type=float, default=1.0, help='Interval between batches (seconds)')
+    parser.add_argument('--batch-size', type=int, default=KINESIS_MAX_RECORDS_PER_PUT,
+                        help=f'Records per PutRecords call (max {KINESIS_MAX_RECORDS_PER_PUT})')
     
     args = parser.parse_args()
+    if args.count < 0:
+        parser.error('--count must be zero or greater')
+    batch_size = max(1, min(args.batch_size, KINESIS_MAX_RECORDS_PER_PUT))
     
     print(f"🚀 Starting to send {args.count} test records to stream '{args.stream_name}'")
     print(f"📍 Region: {args.region}")
     print(f"⏱️  Interval: {args.interval} seconds")
+    print(f"📦 Batch size: {batch_size}")
     print("-" * 50)
     
+    kinesis_client = create_kinesis_client(args.region)
+    samples = generate_sample_data_batch(args.count)
     success_count = 0
     
-    for i in range(args.count):
-        print(f"📤 Sending record {i+1}/{args.count}...")
+    for start in range(0, args.count, batch_size):
+        end = min(start + batch_size, args.count)
+        print(f"📤 Sending records {start+1}-{end}/{args.count}...")
         
-        # Generate sample data
-        sample_data = generate_sample_data()
+        # Take the next batch of sample data
+        batch = list(islice(samples, end - start))
         
         # Send to Kinesis
-        if send_to_kinesis(args.stream_name, sample_data, args.region):
-            success_count += 1
+        success_count += send_to_kinesis(kinesis_client, args.stream_name, batch)
         
-        # Wait before next send
-        if i < args.count - 1:  # Don't wait after the last record
+        # Wait before next batch
+        if end < args.count:  # Don't wait after the last batch
             time.sleep(args.interval)
     
     print("-" * 50)
@@ -0,0 +1,138 @@
+"""
+Unit tests for the Data Processor Lambda Function
+"""
+
+import base64
+import importlib.util
+import os
+import unittest
+from unittest import mock
+
+import orjson
+from botocore.exceptions import ClientError
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+os.environ.setdefault('TIMESTREAM_DATABASE', 'test-database')
+os.environ.setdefault('TIMESTREAM_TABLE', 'test-table')
+os.environ.setdefault('S3_BUCKET', 'test-bucket')
+os.environ.setdefault('KMS_KEY_ID', 'test-key')
+
+HANDLER_PATH = os.path.join(
+    os.path.dirname(__file__), '..', '..', 'lib', 'lambda', 'data-processor', 'index.py'
+)
+spec = importlib.util.spec_from_file_location('data_processor', HANDLER_PATH)
+data_processor = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(data_processor)
+
+
+def build_kinesis_record(payload, sequence_number, arrival_timestamp=1700000000.123):
+    """Build a Kinesis event record carrying the given payload"""
+    return {
+        'kinesis': {
+            'data': base64.b64encode(orjson.dumps(payload)).decode(),
+            'sequenceNumber': sequence_number,
+            'approximateArrivalTimestamp': arrival_timestamp,
+        }
+    }
+
+
+def build_payload(timestamp, temperature):
+    """Build a sample payload with fixed dimensions"""
+    return {
+        'timestamp': timestamp,
+        'source': 'sensor-1',
+        'metrics': {'temperature': temperature},
+        'relationships': {'device_id': 'device-1', 'location': 'tokyo', 'zone': 'zone-a'},
+    }
+
+
+class DataProcessorHandlerTest(unittest.TestCase):
+    def setUp(self):
+        self.timestream_client = mock.MagicMock()
+        self.timestream_client.exceptions = data_processor.timestream_client.exceptions
+        patchers = [
+            mock.patch.object(data_processor, 'timestream_client', self.timestream_client),
+            mock.patch.object(data_processor, 's3_client', mock.MagicMock()),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def written_records(self):
+        return [
+            record
+            for call in self.timestream_client.write_records.call_args_list
+            for record in call.kwargs['Records']
+        ]
+
+    def test_same_dimension_records_in_one_put_keep_distinct_times(self):
+        event = {'Records': [
+            build_kinesis_record(build_payload('2026-01-01T00:00:00.000001+00:00', 21.5), '1'),
+            build_kinesis_record(build_payload('2026-01-01T00:00:00.000002+00:00', 22.5), '2'),
+        ]}
+
+        response = data_processor.handler(event, None)
+
+        records = self.written_records()
+        self.assertEqual(response, {'batchItemFailures': []})
+        self.assertEqual(len(records), 2)
+        self.assertEqual(records[0]['Dimensions'], records[1]['Dimensions'])
+        self.assertNotEqual(records[0]['Time'], records[1]['Time'])
+
+    def build_event(self, count):
+        return {'Records': [
+            build_kinesis_record(build_payload(f'2026-01-01T00:00:00.00000{i}+00:00', 20.0 + i), str(i))
+            for i in range(count)
+        ]}
+
+    def test_rejected_records_are_dropped_not_retried(self):
+        self.timestream_client.write_records.side_effect = (
+            data_processor.timestream_client.exceptions.RejectedRecordsException(
+                {
+                    'Error': {'Code': 'RejectedRecordsException', 'Message': 'rejected'},
+                    'RejectedRecords': [{'RecordIndex': 1, 'Reason': 'Record version conflict'}],
+                },
+                'WriteRecords',
+            )
+        )
+
+        response = data_processor.handler(self.build_event(3), None)
+
+        self.assertEqual(response, {'batchItemFailures': []})
+
+    def test_throttled_chunk_is_reported_for_retry(self):
+        self.timestream_client.write_records.side_effect = ClientError(
+            {'Error': {'Code': 'ThrottlingException', 'Message': 'slow down'}}, 'WriteRecords'
+        )
+
+        response = data_processor.handler(self.build_event(2), None)
+
+        self.assertCountEqual(
+            response['batchItemFailures'],
+            [{'itemIdentifier': '0'}, {'itemIdentifier': '1'}],
+        )
+
+    def test_invalid_chunk_is_dropped_not_retried(self):
+        self.timestream_client.write_records.side_effect = ClientError(
+            {'Error': {'Code': 'ValidationException', 'Message': 'invalid'}}, 'WriteRecords'
+        )
+
+        response = data_processor.handler(self.build_event(2), None)
+
+        self.assertEqual(response, {'batchItemFailures': []})
+
+    def test_record_time_falls_back_to_arrival_time(self):
+        payload = build_payload(None, 21.5)
+
+        record_time = data_processor.get_record_time(payload, {'approximateArrivalTimestamp': 1700000000.123})
+
+        self.assertEqual(record_time, '1700000000123000')
+
+    def test_naive_payload_timestamp_is_treated_as_utc(self):
+        payload = build_payload('1970-01-01T00:00:01.000002', 21.5)
+
+        self.assertEqual(data_processor.get_record_time(payload, {}), '1000002')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -9,7 +9,8 @@ describe('TimestreamNeptuneStack', () => {
   let template: Template;
 
   beforeEach(() => {
-    app = new cdk.App();
+    // Skip Docker bundling of the Lambda assets during synthesis
+    app = new cdk.App({ context: { 'aws:cdk:bundling-stacks': [] } });
   });
 
   describe('Development Environment', () => {
@@ -65,6 +66,12 @@ describe('TimestreamNeptuneStack', () => {
       });
     });
 
+    test('should report partial batch failures from Kinesis', () => {
+      template.hasResourceProperties('AWS::Lambda::EventSourceMapping', {
+        FunctionResponseTypes: ['ReportBatchItemFailures'],
+      });
+    });
+
     test('should create S3 Bucket with security features', () => {
       template.hasResourceProperties('AWS::S3::Bucket', {
         BucketEncryption: {
@@ -73,6 +80,7 @@ describe('TimestreamNeptuneStack', () => {
               ServerSideEncryptionByDefault: {
                 SSEAlgorithm: 'aws:kms',
               },
+              BucketKeyEnabled: true,
             },
           ],
         },